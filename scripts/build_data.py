@@ -1,16 +1,17 @@
 #!/usr/bin/env python3
-import json
+import hashlib
 import math
 from pathlib import Path
-from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
+import orjson
+import polars as pl
 
 
 # ---------------------------
 # Config
 # ---------------------------
-TRACKED_PLAYERS = {"Armygeddon", "Jobby", "Miza", "Bucis", "Youare22"}
+TRACKED_PLAYERS = frozenset({"Armygeddon", "Jobby", "Miza", "Bucis", "Youare22"})
 ALIASES = {
     "Misa": "Miza",
 }
@@ -20,68 +21,92 @@ HANDICAP_BEST = 8
 HANDICAP_POINTS_PER_STROKE = 10.0
 HANDICAP_CAP = 6.0  # +/- cap
 BEST10_COUNT = 10
+UDISC_DT_FORMAT = "%Y-%m-%d %H%M"
+ISO_DT_FORMAT = "%Y-%m-%dT%H:%M:%S"
+HOLE_COLUMNS = [f"Hole{i}" for i in range(1, 28)]
+JSON_OPTIONS = orjson.OPT_INDENT_2
+PLUS_MINUS_COLUMNS = ("+/−", "+/-")  # UDisc exports have used both spellings
+CSV_COLUMNS = {
+    "PlayerName",
+    "CourseName",
+    "LayoutName",
+    "StartDate",
+    "EndDate",
+    "Total",
+    *PLUS_MINUS_COLUMNS,
+    "RoundRating",
+    *HOLE_COLUMNS,
+}
+CSV_DTYPES = {
+    "PlayerName": pl.String,
+    "CourseName": pl.String,
+    "LayoutName": pl.String,
+    "StartDate": pl.String,
+    "EndDate": pl.String,
+    # Read as text so the non-strict casts below null out junk like "DNF"
+    # (polars only infers types from the first rows and would fail the parse)
+    "Total": pl.String,
+    "RoundRating": pl.String,
+    **{col: pl.String for col in PLUS_MINUS_COLUMNS},
+    **{col: pl.Float32 for col in HOLE_COLUMNS},
+}
 
 
 # ---------------------------
 # Helpers
 # ---------------------------
-def parse_udisc_dt(s: str) -> datetime:
-    # Example: "2025-12-22 0349" (no colon in time)
-    s = str(s).strip()
-    return datetime.strptime(s, "%Y-%m-%d %H%M")
-
-
-def first_sunday(year: int, month: int) -> date:
-    d = date(year, month, 1)
-    # weekday(): Mon=0 ... Sun=6
-    days_until_sun = (6 - d.weekday()) % 7
-    return d + timedelta(days=days_until_sun)
+def first_sunday(year: pl.Expr, month: int) -> pl.Expr:
+    d = pl.date(year, month, 1)
+    # weekday(): Mon=1 ... Sun=7
+    days_until_sun = (7 - d.dt.weekday()) % 7
+    return d + pl.duration(days=days_until_sun)
 
 
-def season_for(d: date) -> dict:
+def season_columns(start_dt: pl.Expr) -> list[pl.Expr]:
     """
     Season rules:
     - Summer starts first Sunday in October, ends first Saturday in April.
     - Winter starts first Sunday in April, ends first Saturday in October.
 
     We assign by the round date.
+    Returns SeasonType and SeasonLabel expressions.
     """
-    apr_start = first_sunday(d.year, 4)
-    oct_start = first_sunday(d.year, 10)
+    round_date = start_dt.dt.date()
+    year = start_dt.dt.year()
+    is_winter = (round_date >= first_sunday(year, 4)) & (round_date < first_sunday(year, 10))
+    # Summer spans across year boundary: Jan–Mar belongs to Summer that started in Oct of previous year
+    summer_year = pl.when(round_date >= first_sunday(year, 10)).then(year).otherwise(year - 1)
 
-    if d >= oct_start:
-        # Summer spans across year boundary
-        return {
-            "season_type": "Summer",
-            "season_label": f"Summer {d.year}-{str(d.year + 1)[-2:]}",
-            "season_start": oct_start.isoformat(),
-        }
-    if d >= apr_start:
-        return {
-            "season_type": "Winter",
-            "season_label": f"Winter {d.year}",
-            "season_start": apr_start.isoformat(),
-        }
-    # Jan–Mar belongs to Summer that started in Oct of previous year
-    prev_oct_start = first_sunday(d.year - 1, 10)
-    return {
-        "season_type": "Summer",
-        "season_label": f"Summer {d.year - 1}-{str(d.year)[-2:]}",
-        "season_start": prev_oct_start.isoformat(),
-    }
+    season_type = pl.when(is_winter).then(pl.lit("Winter")).otherwise(pl.lit("Summer"))
+    season_label = (
+        pl.when(is_winter)
+        .then(pl.format("Winter {}", year))
+        .otherwise(pl.format("Summer {}-{}", summer_year, (summer_year + 1).cast(pl.String).str.slice(-2)))
+    )
+    return [season_type.alias("SeasonType"), season_label.alias("SeasonLabel")]
 
 
-def round_half(x: float) -> float:
-    return round(x * 2.0) / 2.0
+def round_id(key: str) -> str:
+    # blake2b rather than hash()/Expr.hash: the id is published in rounds.json,
+    # so it must not change between runs or library versions
+    return str(int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big"))
 
 
-def safe_float(x):
-    try:
-        if pd.isna(x):
-            return None
-        return float(x)
-    except Exception:
-        return None
+def write_json(path: Path, obj) -> None:
+    path.write_bytes(orjson.dumps(obj, option=JSON_OPTIONS))
+
+
+def write_json_records(path: Path, records: pl.DataFrame) -> None:
+    """
+    Stream a frame out as a JSON array of row objects, one row at a time,
+    so memory doesn't grow with a list of dicts. Layout matches write_json.
+    """
+    with path.open("wb") as f:
+        f.write(b"[")
+        for i, row in enumerate(records.iter_rows(named=True)):
+            f.write(b",\n  " if i else b"\n  ")
+            f.write(orjson.dumps(row, option=JSON_OPTIONS).replace(b"\n", b"\n  "))
+        f.write(b"\n]" if len(records) else b"]")
 
 
 # ---------------------------
@@ -96,158 +121,139 @@ def main():
     if not csv_path.exists():
         raise SystemExit(f"CSV not found at: {csv_path}")
 
-    df = pd.read_csv(csv_path)
-
-    # Canonicalise player names (alias + strip)
-    df["PlayerName"] = df["PlayerName"].astype(str).str.strip()
-    df["PlayerName"] = df["PlayerName"].apply(lambda n: ALIASES.get(n, n))
-
-    # Parse datetimes
-    df["StartDT"] = df["StartDate"].apply(parse_udisc_dt)
-    df["EndDT"] = df["EndDate"].apply(parse_udisc_dt)
+    # Only load what we emit
+    scan = pl.scan_csv(csv_path, schema_overrides=CSV_DTYPES)
+    header = scan.collect_schema().names()
+    scan = scan.select([c for c in header if c in CSV_COLUMNS])
+    pm_col = next((c for c in PLUS_MINUS_COLUMNS if c in header), None)
 
     # Enforce "full 18-hole rounds" = Holes 1-18 present AND no extra holes 19+
-    hole_1_18 = [f"Hole{i}" for i in range(1, 19)]
-    hole_19_plus = [f"Hole{i}" for i in range(19, 28)]
-
-    has_all_18 = ~df[hole_1_18].isna().any(axis=1)
-    has_extra = df[hole_19_plus].notna().any(axis=1)
-    full_18_only = has_all_18 & (~has_extra)
-
-    # Filter to tracked players + full 18 only
-    df = df[df["PlayerName"].isin(TRACKED_PLAYERS) & full_18_only].copy()
-
-    # Rating handling
-    df["RoundRatingNum"] = pd.to_numeric(df["RoundRating"], errors="coerce")
-    df["IsRated"] = df["RoundRatingNum"].notna()
-
-    # Season tagging
-    df["RoundDate"] = df["StartDT"].dt.date
-    season_meta = df["RoundDate"].apply(season_for)
-    df["SeasonType"] = season_meta.apply(lambda x: x["season_type"])
-    df["SeasonLabel"] = season_meta.apply(lambda x: x["season_label"])
-
-    # Layout-aware key
-    df["CourseKey"] = df["CourseName"].astype(str).str.strip() + " — " + df["LayoutName"].astype(str).str.strip()
-
-    # Create a stable round id
-    df["RoundId"] = (
-        df["PlayerName"].astype(str)
-        + "|"
-        + df["CourseKey"].astype(str)
-        + "|"
-        + df["StartDate"].astype(str)
-        + "|"
-        + df["Total"].astype(str)
-    ).apply(lambda s: str(abs(hash(s))))
+    hole_1_18 = HOLE_COLUMNS[:18]
+    hole_19_plus = HOLE_COLUMNS[18:]
+    full_18_only = pl.all_horizontal(pl.col(hole_1_18).is_not_null()) & ~pl.any_horizontal(
+        pl.col(hole_19_plus).is_not_null()
+    )
+
+    df = (
+        scan
+        # Canonicalise player names (alias + strip)
+        .with_columns(pl.col("PlayerName").str.strip_chars().replace(ALIASES))
+        # Filter to tracked players + full 18 only
+        .filter(pl.col("PlayerName").is_in(list(TRACKED_PLAYERS)) & full_18_only)
+        .with_columns(pl.col("StartDate", "EndDate", "Total", "RoundRating", "CourseName", "LayoutName").str.strip_chars())
+        # Parse datetimes, e.g. "2025-12-22 0349" (no colon in time)
+        .with_columns(
+            pl.col("StartDate").str.strptime(pl.Datetime, UDISC_DT_FORMAT).alias("StartDT"),
+            pl.col("EndDate").str.strptime(pl.Datetime, UDISC_DT_FORMAT).alias("EndDT"),
+            # Score + rating handling
+            pl.col("Total").cast(pl.Float64, strict=False).alias("TotalNum"),
+            pl.col("RoundRating").cast(pl.Float64, strict=False).alias("RoundRatingNum"),
+        )
+        .with_columns(
+            pl.col("RoundRatingNum").is_not_null().alias("IsRated"),
+            # Season tagging
+            *season_columns(pl.col("StartDT")),
+            # Layout-aware key
+            pl.concat_str([pl.col("CourseName"), pl.col("LayoutName")], separator=" — ").alias("CourseKey"),
+        )
+        # Create a stable round id from the stripped key fields
+        .with_columns(
+            pl.concat_str(pl.col("PlayerName", "CourseKey", "StartDate", "Total").fill_null(""), separator="|")
+            .map_elements(round_id, return_dtype=pl.String)
+            .alias("RoundId")
+        )
+        .collect()
+    )
 
     # Build rounds.json (keep it tidy and web-friendly)
-    rounds = []
-    for _, r in df.sort_values("StartDT").iterrows():
-        rounds.append(
-            {
-                "round_id": r["RoundId"],
-                "player": r["PlayerName"],
-                "course": str(r["CourseName"]).strip(),
-                "layout": str(r["LayoutName"]).strip(),
-                "course_key": r["CourseKey"],
-                "start": r["StartDT"].isoformat(),
-                "end": r["EndDT"].isoformat(),
-                "total": safe_float(r["Total"]),
-                "plus_minus": str(r["+/−"]) if "+/−" in df.columns else str(r.get("+/-", "")),
-                "rating": safe_float(r["RoundRatingNum"]),
-                "is_rated": bool(r["IsRated"]),
-                "season_type": r["SeasonType"],
-                "season_label": r["SeasonLabel"],
-            }
-        )
+    rounds_df = df.sort("StartDT", maintain_order=True).select(
+        round_id=pl.col("RoundId"),
+        player=pl.col("PlayerName"),
+        course=pl.col("CourseName"),
+        layout=pl.col("LayoutName"),
+        course_key=pl.col("CourseKey"),
+        start=pl.col("StartDT").dt.strftime(ISO_DT_FORMAT),
+        end=pl.col("EndDT").dt.strftime(ISO_DT_FORMAT),
+        total=pl.col("TotalNum"),
+        plus_minus=pl.col(pm_col).fill_null("") if pm_col else pl.lit(""),
+        rating=pl.col("RoundRatingNum"),
+        is_rated=pl.col("IsRated"),
+        season_type=pl.col("SeasonType"),
+        season_label=pl.col("SeasonLabel"),
+    )
 
     # --- Season ladders: Sum of best 10 ratings per season
-    ladders = []
-    rated_df = df[df["IsRated"]].copy()
-    for (season_label, player), g in rated_df.groupby(["SeasonLabel", "PlayerName"]):
-        ratings = sorted(g["RoundRatingNum"].dropna().astype(float).tolist(), reverse=True)
-        top10 = ratings[:BEST10_COUNT]
-        ladders.append(
-            {
-                "season_label": season_label,
-                "player": player,
-                "season_total_best10": float(sum(top10)) if top10 else None,
-                "rated_rounds_in_season": int(len(ratings)),
-                "counted_rounds": int(len(top10)),
-                "best_round_rating": float(max(ratings)) if ratings else None,
-            }
+    rated_df = df.filter(pl.col("IsRated"))
+    rating = pl.col("RoundRatingNum")
+    ladders = (
+        rated_df.group_by("SeasonLabel", "PlayerName")
+        .agg(
+            season_total_best10=rating.top_k(BEST10_COUNT).sum(),
+            rated_rounds_in_season=pl.len(),
+            counted_rounds=pl.len().clip(upper_bound=BEST10_COUNT),
+            best_round_rating=rating.max(),
         )
+        .sort("SeasonLabel", "PlayerName")
+        .rename({"SeasonLabel": "season_label", "PlayerName": "player"})
+        .to_dicts()
+    )
 
     # --- Handicaps: best 8 of last 20 rated rounds (rounded to 0.5, capped +/-6)
-    handicaps = []
-    player_form = {}
-
-    for player, g in rated_df.groupby("PlayerName"):
-        g2 = g.sort_values("StartDT", ascending=False)
-        last20 = g2.head(HANDICAP_WINDOW)
-        ratings = last20["RoundRatingNum"].dropna().astype(float).tolist()
-
-        if len(ratings) < HANDICAP_MIN_ROUNDS:
-            player_form[player] = None
-            continue
-
-        best8 = sorted(ratings, reverse=True)[:HANDICAP_BEST]
-        form_index = sum(best8) / len(best8)
-        player_form[player] = form_index
-
-    eligible_forms = [v for v in player_form.values() if v is not None]
-    reference = sum(eligible_forms) / len(eligible_forms) if eligible_forms else None
-
-    for player in sorted(TRACKED_PLAYERS):
-        form_index = player_form.get(player)
-        if reference is None or form_index is None:
-            handicaps.append(
-                {
-                    "player": player,
-                    "handicap": None,
-                    "form_index": form_index,
-                    "reference_rating": reference,
-                    "method": f"best {HANDICAP_BEST} of last {HANDICAP_WINDOW} rated rounds; {HANDICAP_POINTS_PER_STROKE:g} pts = 1 stroke",
-                    "status": "No handicap yet (insufficient rated rounds)",
-                }
-            )
-            continue
-
-        raw = (reference - form_index) / HANDICAP_POINTS_PER_STROKE
-        h = round_half(raw)
-        h = max(-HANDICAP_CAP, min(HANDICAP_CAP, h))
-
-        handicaps.append(
-            {
-                "player": player,
-                "handicap": float(h),
-                "form_index": float(form_index),
-                "reference_rating": float(reference),
-                "method": f"best {HANDICAP_BEST} of last {HANDICAP_WINDOW} rated rounds; {HANDICAP_POINTS_PER_STROKE:g} pts = 1 stroke",
-                "status": "OK",
-            }
+    last_n = rating.sort_by("StartDT", descending=True).head(HANDICAP_WINDOW)
+    form = (
+        rated_df.group_by("PlayerName")
+        .agg(form_index=pl.when(pl.len() >= HANDICAP_MIN_ROUNDS).then(last_n.top_k(HANDICAP_BEST).mean()))
+        .rename({"PlayerName": "player"})
+    )
+    reference = form["form_index"].mean()  # None when nobody has enough rated rounds
+
+    raw = (pl.lit(reference, dtype=pl.Float64) - pl.col("form_index")) / HANDICAP_POINTS_PER_STROKE
+    handicap = ((raw * 2.0).round(0) / 2.0).clip(-HANDICAP_CAP, HANDICAP_CAP)
+    # round() gives -0.0 for small negatives; emit 0.0 like the scalar round() did
+    handicap = pl.when(handicap == 0).then(0.0).otherwise(handicap)
+    handicaps = (
+        pl.DataFrame({"player": sorted(TRACKED_PLAYERS)})
+        .join(form, on="player", how="left")
+        .select(
+            "player",
+            handicap.alias("handicap"),
+            "form_index",
+            pl.lit(reference, dtype=pl.Float64).alias("reference_rating"),
+            pl.lit(
+                f"best {HANDICAP_BEST} of last {HANDICAP_WINDOW} rated rounds; {HANDICAP_POINTS_PER_STROKE:g} pts = 1 stroke"
+            ).alias("method"),
+            pl.when(handicap.is_not_null())
+            .then(pl.lit("OK"))
+            .otherwise(pl.lit("No handicap yet (insufficient rated rounds)"))
+            .alias("status"),
         )
+        .to_dicts()
+    )
 
     # --- Players summary (simple starter pack)
-    players = []
-    for player, g in df.groupby("PlayerName"):
-        rated = g[g["IsRated"]]
-        players.append(
-            {
-                "player": player,
-                "rounds": int(len(g)),
-                "rated_rounds": int(len(rated)),
-                "best_rating": float(rated["RoundRatingNum"].max()) if len(rated) else None,
-                "avg_rating": float(rated["RoundRatingNum"].mean()) if len(rated) else None,
-            }
+    players = (
+        df.group_by("PlayerName")
+        .agg(
+            rounds=pl.len(),
+            rated_rounds=pl.col("IsRated").sum(),
+            best_rating=rating.max(),
+            avg_rating=rating.mean(),
         )
-
-    # Write outputs
-    (out_dir / "rounds.json").write_text(json.dumps(rounds, indent=2), encoding="utf-8")
-    (out_dir / "ladders.json").write_text(json.dumps(ladders, indent=2), encoding="utf-8")
-    (out_dir / "handicaps.json").write_text(json.dumps(handicaps, indent=2), encoding="utf-8")
-    (out_dir / "players.json").write_text(json.dumps(players, indent=2), encoding="utf-8")
+        .sort("PlayerName")
+        .rename({"PlayerName": "player"})
+        .to_dicts()
+    )
+
+    # Write outputs (in parallel so the file IO overlaps)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        writes = [
+            pool.submit(write_json_records, out_dir / "rounds.json", rounds_df),
+            pool.submit(write_json, out_dir / "ladders.json", ladders),
+            pool.submit(write_json, out_dir / "handicaps.json", handicaps),
+            pool.submit(write_json, out_dir / "players.json", players),
+        ]
+        for w in writes:
+            w.result()  # re-raise any write error
 
     print("Wrote:")
     print(" - _data/rounds.json")